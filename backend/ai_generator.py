@@ -1,7 +1,38 @@
 import anthropic
 import ollama
+import httpx
+import asyncio
+import functools
 import json
-from typing import List, Optional, Dict, Any
+import re
+from typing import List, Optional, Dict, Any, Tuple
+
+# Keep-alive connection pool for LLM HTTP calls so repeated requests reuse sockets
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=60)
+
+# Every client handed out by get_anthropic_client, so shutdown can close them all
+_anthropic_clients: List[anthropic.AsyncAnthropic] = []
+
+# Unbounded so a second API key never evicts a client that is still open
+@functools.lru_cache(maxsize=None)
+def get_anthropic_client(api_key: str) -> anthropic.AsyncAnthropic:
+    """Get the process-wide Anthropic client so every generator shares one connection pool"""
+    client = anthropic.AsyncAnthropic(
+        api_key=api_key,
+        max_retries=3,
+        timeout=httpx.Timeout(60.0, connect=5.0),
+        http_client=anthropic.DefaultAsyncHttpxClient(limits=HTTP_LIMITS)
+    )
+    _anthropic_clients.append(client)
+    return client
+
+async def close_anthropic_clients():
+    """Close the shared Anthropic clients and clear the cache so none is handed out closed"""
+    get_anthropic_client.cache_clear()
+    clients = list(_anthropic_clients)
+    _anthropic_clients.clear()
+    for client in clients:
+        await client.close()
 
 class AIGenerator:
     """Handles interactions with AI models (Anthropic Claude or local Ollama) for generating responses"""
@@ -32,19 +63,30 @@ All responses must be:
 Provide only the direct answer to what was asked.
 """
     
+    # Anthropic system blocks - kept identical across requests so the prompt cache prefix stays valid
+    SYSTEM_BLOCKS = [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+    
+    # Keywords that trigger a course search for Ollama (substring match, case-insensitive)
+    _SEARCH_KW_RE = re.compile(r"course|lesson|instructor|content|material|chapter|topic", re.IGNORECASE)
+    
+    # custom_id format used by submit_batch
+    _BATCH_ID_RE = re.compile(r"q-(\d+)")
+    
     def __init__(self, provider: str, api_key: str = "", model: str = "", ollama_base_url: str = "http://localhost:11434"):
         self.provider = provider.lower()
         self.model = model
         
         if self.provider == "anthropic":
-            self.client = anthropic.Anthropic(api_key=api_key)
+            self.client = get_anthropic_client(api_key)
             self.base_params = {
                 "model": self.model,
                 "temperature": 0,
                 "max_tokens": 800
             }
+            # Static request fields as pairs - dict() of an exact-size tuple is a single C-level build per call
+            self._base_items = tuple(self.base_params.items())
         elif self.provider == "ollama":
-            self.ollama_client = ollama.Client(host=ollama_base_url)
+            self.ollama_client = ollama.AsyncClient(host=ollama_base_url, limits=HTTP_LIMITS)
             self.base_params = {
                 "model": self.model,
                 "options": {
@@ -55,50 +97,67 @@ Provide only the direct answer to what was asked.
         else:
             raise ValueError(f"Unsupported AI provider: {provider}")
     
-    def generate_response(self, query: str,
-                         conversation_history: Optional[str] = None,
-                         tools: Optional[List] = None,
-                         tool_manager=None) -> str:
+    async def aclose(self):
+        """Close the pooled HTTP connections held by this generator's own client
+        
+        The Anthropic client is shared process-wide and is closed by close_anthropic_clients.
+        """
+        if self.provider == "ollama":
+            # ollama 0.4.4 (pinned) has no public close() and keeps its httpx.AsyncClient on the
+            # private _client attribute; look it up defensively so an upgrade can't break shutdown
+            http_client = getattr(self.ollama_client, "_client", None)
+            if isinstance(http_client, httpx.AsyncClient):
+                await http_client.aclose()
+            else:
+                print("Ollama client exposes no httpx client to close; skipping connection pool cleanup")
+    
+    @staticmethod
+    def _with_tool_cache(tools: List) -> List:
+        """Mark the last tool definition as a prompt cache breakpoint without mutating the input"""
+        return [*tools[:-1], {**tools[-1], "cache_control": {"type": "ephemeral"}}]
+    
+    def _build_anthropic_params(self, query: str, history_messages: List[Dict[str, str]], tools: Optional[List]) -> Dict[str, Any]:
+        """Build Anthropic API parameters on top of the cached static request fields"""
+        api_params = dict(self._base_items)
+        api_params["messages"] = [*history_messages, {"role": "user", "content": query}]
+        api_params["system"] = self.SYSTEM_BLOCKS
+        
+        # Add tools if available
+        if tools:
+            api_params["tools"] = self._with_tool_cache(tools)
+            api_params["tool_choice"] = {"type": "auto"}
+        
+        return api_params
+    
+    async def generate_response(self, query: str,
+                               conversation_history: Optional[List[Dict[str, str]]] = None,
+                               tools: Optional[List] = None,
+                               tool_manager=None) -> Tuple[str, List[Dict[str, Any]]]:
         """
         Generate AI response with optional tool usage and conversation context.
         
         Args:
             query: The user's question or request
-            conversation_history: Previous messages for context
+            conversation_history: Previous messages as role/content dicts
             tools: Available tools the AI can use
             tool_manager: Manager to execute tools
             
         Returns:
-            Generated response as string
+            Tuple of (generated response, sources from tool calls made for this request)
         """
         
-        # Build system content efficiently - avoid string ops when possible
-        system_content = (
-            f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history 
-            else self.SYSTEM_PROMPT
-        )
-        
-        # Prepare API call parameters efficiently
-        api_params = {
-            **self.base_params,
-            "messages": [{"role": "user", "content": query}],
-            "system": system_content
-        }
-        
-        # Add tools if available
-        if tools:
-            api_params["tools"] = tools
-            api_params["tool_choice"] = {"type": "auto"}
+        # History is replayed as prior turns so the system prompt never changes
+        history_messages = conversation_history or []
         
         if self.provider == "anthropic":
-            return self._generate_anthropic_response(api_params, tools, tool_manager)
+            api_params = self._build_anthropic_params(query, history_messages, tools)
+            return await self._generate_anthropic_response(api_params, tools, tool_manager)
         elif self.provider == "ollama":
-            return self._generate_ollama_response(query, system_content, tools, tool_manager)
+            return await self._generate_ollama_response(query, history_messages, tools, tool_manager)
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
     
-    def _handle_tool_execution(self, initial_response, base_params: Dict[str, Any], tool_manager):
+    async def _handle_tool_execution(self, initial_response, base_params: Dict[str, Any], tool_manager) -> Tuple[str, List[Dict[str, Any]]]:
         """
         Handle execution of tool calls and get follow-up response.
         
@@ -108,100 +167,185 @@ Provide only the direct answer to what was asked.
             tool_manager: Manager to execute tools
             
         Returns:
-            Final response text after tool execution
+            Tuple of (final response text after tool execution, sources from the tool calls)
         """
-        # Start with existing messages
-        messages = base_params["messages"].copy()
-        
-        # Add AI's tool use response
-        messages.append({"role": "assistant", "content": initial_response.content})
-        
-        # Execute all tool calls and collect results
-        tool_results = []
-        for content_block in initial_response.content:
-            if content_block.type == "tool_use":
-                tool_result = tool_manager.execute_tool(
-                    content_block.name, 
-                    **content_block.input
-                )
-                
-                tool_results.append({
-                    "type": "tool_result",
-                    "tool_use_id": content_block.id,
-                    "content": tool_result
-                })
-        
-        # Add tool results as single message
-        if tool_results:
-            messages.append({"role": "user", "content": tool_results})
-        
-        # Prepare final API call without tools
-        final_params = {
-            **self.base_params,
-            "messages": messages,
-            "system": base_params["system"]
-        }
+        final_params, sources = await self._build_tool_followup_params(initial_response, base_params, tool_manager)
         
         # Get final response
-        final_response = self.client.messages.create(**final_params)
-        return final_response.content[0].text
+        final_response = await self.client.messages.create(**final_params)
+        return final_response.content[0].text, sources
     
-    def _generate_anthropic_response(self, api_params: Dict[str, Any], tools: Optional[List], tool_manager) -> str:
+    async def _build_tool_followup_params(self, initial_response, base_params: Dict[str, Any],
+                                          tool_manager) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Execute requested tool calls and build parameters for the follow-up call.
+        
+        Args:
+            initial_response: The response containing tool use requests
+            base_params: Base API parameters
+            tool_manager: Manager to execute tools
+            
+        Returns:
+            Tuple of (API parameters for the follow-up call with tool use disabled, sources from the tool calls)
+        """
+        # Execute all tool calls concurrently - they are independent lookups
+        tool_blocks = [block for block in initial_response.content if block.type == "tool_use"]
+        outputs = await asyncio.gather(*(
+            tool_manager.execute_tool(block.name, **block.input) for block in tool_blocks
+        ))
+        
+        # Collect results, matched to their tool_use_id
+        tool_results = [
+            {"type": "tool_result", "tool_use_id": block.id, "content": output}
+            for block, (output, _) in zip(tool_blocks, outputs)
+        ]
+        
+        # Merge sources from every call in tool_use order, independent of which thread finished first
+        sources = [source for _, call_sources in outputs for source in call_sources]
+        
+        # Extend existing messages with AI's tool use response and tool results as single message
+        followup = [{"role": "assistant", "content": initial_response.content}]
+        if tool_results:
+            followup.append({"role": "user", "content": tool_results})
+        messages = base_params["messages"] + followup
+        
+        # Prepare final API call - tools stay in the request so the cached tools+system prefix
+        # matches the first call, but tool_choice "none" stops the model from calling another tool
+        final_params = dict(self._base_items)
+        final_params["messages"] = messages
+        final_params["system"] = base_params["system"]
+        if "tools" in base_params:
+            final_params["tools"] = base_params["tools"]
+            final_params["tool_choice"] = {"type": "none"}
+        return final_params, sources
+    
+    async def _generate_anthropic_response(self, api_params: Dict[str, Any], tools: Optional[List],
+                                           tool_manager) -> Tuple[str, List[Dict[str, Any]]]:
         """Generate response using Anthropic Claude"""
         # Get response from Claude
-        response = self.client.messages.create(**api_params)
+        response = await self.client.messages.create(**api_params)
         
         # Handle tool execution if needed
         if response.stop_reason == "tool_use" and tool_manager:
-            return self._handle_tool_execution(response, api_params, tool_manager)
+            return await self._handle_tool_execution(response, api_params, tool_manager)
         
         # Return direct response
-        return response.content[0].text
+        return response.content[0].text, []
     
-    def _generate_ollama_response(self, query: str, system_content: str, tools: Optional[List], tool_manager) -> str:
+    async def _generate_ollama_response(self, query: str, history_messages: List[Dict[str, str]], tools: Optional[List],
+                                        tool_manager) -> Tuple[str, List[Dict[str, Any]]]:
         """Generate response using local Ollama model"""
         # For Ollama, we need to handle tools differently since it doesn't have native tool calling
         # We'll use a simplified approach: if tools are available, we'll ask the model to decide
         
         messages = [
-            {"role": "system", "content": system_content},
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            *history_messages,
             {"role": "user", "content": query}
         ]
         
         # Add tool information to the prompt if tools are available
+        sources = []
         if tools and tool_manager:
             # Simple tool handling for Ollama - check if search is needed
-            search_keywords = ["course", "lesson", "instructor", "content", "material", "chapter", "topic"]
-            query_lower = query.lower()
-            
-            if any(keyword in query_lower for keyword in search_keywords):
+            if self._SEARCH_KW_RE.search(query):
                 # Execute search tool
                 try:
-                    search_result = tool_manager.execute_tool("search_course_content", query=query)
+                    search_result, sources = await tool_manager.execute_tool("search_course_content", query=query)
                     enhanced_query = f"{query}\n\nRelevant course content:\n{search_result}"
                     messages[-1]["content"] = enhanced_query
                 except Exception as e:
                     print(f"Search tool error: {e}")
         
         # Generate response with Ollama
-        response = self.ollama_client.chat(
+        response = await self.ollama_client.chat(
             model=self.model,
             messages=messages,
             options=self.base_params["options"]
         )
         
-        return response['message']['content']
+        return response['message']['content'], sources
+    
+    async def submit_batch(self, queries: List[str]) -> str:
+        """
+        Submit independent queries to the Anthropic Message Batches API.
+        
+        Intended for non-interactive workloads (evaluation, pre-summarization) where
+        lower cost matters more than latency. Tools are not available in batch mode.
+        Processing can take up to 24 hours; collect answers with get_batch_results.
+        
+        Args:
+            queries: The questions to answer
+            
+        Returns:
+            The id of the submitted batch
+        """
+        if self.provider != "anthropic":
+            raise ValueError(f"Batch generation is not supported for provider: {self.provider}")
+        if not queries:
+            raise ValueError("At least one query is required")
+        
+        batch = await self.client.messages.batches.create(
+            requests=[
+                {"custom_id": f"q-{i}", "params": self._build_anthropic_params(query, [], None)}
+                for i, query in enumerate(queries)
+            ]
+        )
+        return batch.id
+    
+    async def get_batch_results(self, batch_id: str) -> Tuple[str, Optional[List[Optional[str]]], Dict[int, str]]:
+        """
+        Check a submitted batch and collect its answers once processing has ended.
+        
+        Args:
+            batch_id: Id returned by submit_batch
+            
+        Returns:
+            Tuple of (processing status, answers in query order - None while in progress
+            or for failed queries, failure result types keyed by query index)
+            
+        Raises:
+            LookupError: If no batch with this id exists
+        """
+        if self.provider != "anthropic":
+            raise ValueError(f"Batch generation is not supported for provider: {self.provider}")
+        
+        try:
+            batch = await self.client.messages.batches.retrieve(batch_id)
+        except anthropic.NotFoundError:
+            raise LookupError(f"Batch not found: {batch_id}")
+        if batch.processing_status != "ended":
+            return batch.processing_status, None, {}
+        
+        counts = batch.request_counts
+        total = counts.processing + counts.succeeded + counts.errored + counts.canceled + counts.expired
+        
+        # Results may arrive in any order, so map them back by custom_id
+        answers: List[Optional[str]] = [None] * total
+        failures: Dict[int, str] = {}
+        async for entry in await self.client.messages.batches.results(batch_id):
+            # Skip entries not submitted by submit_batch (e.g. batches created elsewhere)
+            match = self._BATCH_ID_RE.fullmatch(entry.custom_id)
+            if not match or int(match.group(1)) >= total:
+                continue
+            index = int(match.group(1))
+            if entry.result.type == "succeeded":
+                answers[index] = entry.result.message.content[0].text
+            else:
+                failures[index] = entry.result.type
+        
+        return batch.processing_status, answers, failures
     
-    def generate_response_stream(self, query: str,
-                                conversation_history: Optional[str] = None,
-                                tools: Optional[List] = None,
-                                tool_manager=None):
+    async def generate_response_stream(self, query: str,
+                                      conversation_history: Optional[List[Dict[str, str]]] = None,
+                                      tools: Optional[List] = None,
+                                      tool_manager=None):
         """
         Generate streaming AI response with optional tool usage and conversation context.
         
         Args:
             query: The user's question or request
-            conversation_history: Previous messages for context
+            conversation_history: Previous messages as role/content dicts
             tools: Available tools the AI can use
             tool_manager: Manager to execute tools
             
@@ -209,88 +353,89 @@ Provide only the direct answer to what was asked.
             Dict chunks with response data
         """
         
-        # Build system content efficiently
-        system_content = (
-            f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history 
-            else self.SYSTEM_PROMPT
-        )
+        # History is replayed as prior turns so the system prompt never changes
+        history_messages = conversation_history or []
         
         if self.provider == "anthropic":
-            yield from self._generate_anthropic_response_stream(query, system_content, tools, tool_manager)
+            async for chunk in self._generate_anthropic_response_stream(query, history_messages, tools, tool_manager):
+                yield chunk
         elif self.provider == "ollama":
-            yield from self._generate_ollama_response_stream(query, system_content, tools, tool_manager)
+            async for chunk in self._generate_ollama_response_stream(query, history_messages, tools, tool_manager):
+                yield chunk
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
     
-    def _generate_anthropic_response_stream(self, query: str, system_content: str, tools: Optional[List], tool_manager):
-        """Generate streaming response using Anthropic Claude"""
-        # Anthropic doesn't have native streaming with tools, so we'll use the regular method
-        # and yield the complete response
-        api_params = {
-            **self.base_params,
-            "messages": [{"role": "user", "content": query}],
-            "system": system_content
-        }
+    async def _generate_anthropic_response_stream(self, query: str, history_messages: List[Dict[str, str]], tools: Optional[List], tool_manager):
+        """
+        Generate streaming response using Anthropic Claude.
         
-        if tools:
-            api_params["tools"] = tools
-            api_params["tool_choice"] = {"type": "auto"}
+        Text deltas are relayed as they arrive. If the model then starts a tool call, a
+        {"type": "discard"} chunk tells consumers to drop the preamble streamed so far;
+        the answer written after the tool results is streamed in its place.
+        """
+        api_params = self._build_anthropic_params(query, history_messages, tools)
         
-        response = self.client.messages.create(**api_params)
+        # Relay text deltas until a tool call starts
+        tool_started = False
+        async with self.client.messages.stream(**api_params) as stream:
+            async for event in stream:
+                if event.type == "content_block_start" and event.content_block.type == "tool_use":
+                    if not tool_started and tool_manager:
+                        yield {"type": "discard"}
+                    tool_started = True
+                elif (event.type == "content_block_delta" and event.delta.type == "text_delta"
+                      and not tool_started):
+                    yield {"type": "content", "content": event.delta.text}
+            response = await stream.get_final_message()
         
+        # On tool use, run the tools and stream the follow-up answer token by token
+        sources = []
         if response.stop_reason == "tool_use" and tool_manager:
-            final_response = self._handle_tool_execution(response, api_params, tool_manager)
-            yield {"type": "content", "content": final_response}
-        else:
-            yield {"type": "content", "content": response.content[0].text}
-        
-        # Get sources after response
-        if tool_manager:
-            sources = tool_manager.get_last_sources()
-            if sources:
-                yield {"type": "sources", "sources": sources}
-            tool_manager.reset_sources()
+            final_params, sources = await self._build_tool_followup_params(response, api_params, tool_manager)
+            async with self.client.messages.stream(**final_params) as stream:
+                async for text in stream.text_stream:
+                    yield {"type": "content", "content": text}
+        
+        # Send sources after response
+        if sources:
+            yield {"type": "sources", "sources": sources}
     
-    def _generate_ollama_response_stream(self, query: str, system_content: str, tools: Optional[List], tool_manager):
+    async def _generate_ollama_response_stream(self, query: str, history_messages: List[Dict[str, str]], tools: Optional[List], tool_manager):
         """Generate streaming response using local Ollama model"""
         messages = [
-            {"role": "system", "content": system_content},
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            *history_messages,
             {"role": "user", "content": query}
         ]
         
         # Handle tools for Ollama
         if tools and tool_manager:
-            search_keywords = ["course", "lesson", "instructor", "content", "material", "chapter", "topic"]
-            query_lower = query.lower()
-            
-            if any(keyword in query_lower for keyword in search_keywords):
+            if self._SEARCH_KW_RE.search(query):
                 try:
-                    search_result = tool_manager.execute_tool("search_course_content", query=query)
+                    search_result, sources = await tool_manager.execute_tool("search_course_content", query=query)
                     enhanced_query = f"{query}\n\nRelevant course content:\n{search_result}"
                     messages[-1]["content"] = enhanced_query
                     
                     # Yield sources
-                    sources = tool_manager.get_last_sources()
                     if sources:
                         yield {"type": "sources", "sources": sources}
-                    tool_manager.reset_sources()
                 except Exception as e:
                     print(f"Search tool error: {e}")
         
         # Stream response from Ollama
         try:
-            stream = self.ollama_client.chat(
+            stream = await self.ollama_client.chat(
                 model=self.model,
                 messages=messages,
                 options=self.base_params["options"],
                 stream=True
             )
             
-            for chunk in stream:
+            async for chunk in stream:
                 if 'message' in chunk and 'content' in chunk['message']:
                     content = chunk['message']['content']
                     if content:
                         yield {"type": "content", "content": content}
         except Exception as e:
-            yield {"type": "content", "content": f"Error: {str(e)}"}
\ No newline at end of file
+            # Shown to the user as content, flagged so callers don't treat it as a real answer
+            yield {"type": "content", "content": f"Error: {str(e)}", "error": True}
\ No newline at end of file
@@ -5,14 +5,16 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
-import json
+import orjson
 
 from config import config
 from rag_system import RAGSystem
+from ai_generator import close_anthropic_clients
 
 # Initialize FastAPI app
 app = FastAPI(title="Course Materials RAG System", root_path="")
@@ -33,6 +35,9 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Compress larger JSON responses; event streams are left uncompressed so frames aren't buffered
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
+
 # Initialize RAG system
 rag_system = RAGSystem(config)
 
@@ -48,11 +53,45 @@ class QueryResponse(BaseModel):
     sources: List[str]
     session_id: str
 
+class BatchQueryRequest(BaseModel):
+    """Request model for batch course queries"""
+    queries: List[str]
+
+class BatchSubmitResponse(BaseModel):
+    """Response model for a submitted query batch"""
+    batch_id: str
+
+class BatchStatusResponse(BaseModel):
+    """Response model for query batch status and results"""
+    batch_id: str
+    status: str
+    answers: Optional[List[Optional[str]]] = None  # Set once status is "ended"; None for failed queries
+    failures: Dict[int, str] = {}                   # Query index -> result type (errored, canceled, expired)
+
 class CourseStats(BaseModel):
     """Response model for course statistics"""
     total_courses: int
     course_titles: List[str]
 
+# Server-sent events helpers
+
+# Precomputed SSE framing so each chunk is a single bytes concatenation
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+_SSE_DONE = b"data: [DONE]\n\n"
+
+async def _sse_stream(rag_system: RAGSystem, query: str, session_id: str):
+    """Encode streamed RAG chunks as server-sent event frames"""
+    try:
+        # Process query using RAG system with streaming
+        async for chunk in rag_system.query_stream(query, session_id):
+            yield _SSE_PREFIX + orjson.dumps(chunk) + _SSE_SUFFIX
+    except Exception as e:
+        error_chunk = {"error": str(e)}
+        yield _SSE_PREFIX + orjson.dumps(error_chunk) + _SSE_SUFFIX
+    finally:
+        yield _SSE_DONE
+
 # API Endpoints
 
 @app.post("/api/query", response_model=QueryResponse)
@@ -65,7 +104,7 @@ async def query_documents(request: QueryRequest):
             session_id = rag_system.session_manager.create_session()
         
         # Process query using RAG system
-        answer, sources = rag_system.query(request.query, session_id)
+        answer, sources = await rag_system.query(request.query, session_id)
         
         return QueryResponse(
             answer=answer,
@@ -84,29 +123,49 @@ async def query_documents_stream(request: QueryRequest):
         if not session_id:
             session_id = rag_system.session_manager.create_session()
         
-        def generate_stream():
-            try:
-                # Process query using RAG system with streaming
-                for chunk in rag_system.query_stream(request.query, session_id):
-                    yield f"data: {json.dumps(chunk)}\n\n"
-            except Exception as e:
-                error_chunk = {"error": str(e)}
-                yield f"data: {json.dumps(error_chunk)}\n\n"
-            finally:
-                yield "data: [DONE]\n\n"
-        
         return StreamingResponse(
-            generate_stream(),
-            media_type="text/plain",
+            _sse_stream(rag_system, request.query, session_id),
+            media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Content-Type": "text/event-stream"
+                "Connection": "keep-alive"
             }
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/query/batch", response_model=BatchSubmitResponse, status_code=202)
+async def query_documents_batch(request: BatchQueryRequest):
+    """Submit many queries to the Anthropic Message Batches API; poll the returned batch id for results"""
+    if not config.ENABLE_BATCH_API:
+        raise HTTPException(status_code=404, detail="Batch API is disabled")
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="At least one query is required")
+    
+    try:
+        batch_id = await rag_system.submit_query_batch(request.queries)
+        return BatchSubmitResponse(batch_id=batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/query/batch/{batch_id}", response_model=BatchStatusResponse)
+async def get_query_batch_status(batch_id: str):
+    """Get the processing status of a query batch, with answers once it has ended"""
+    if not config.ENABLE_BATCH_API:
+        raise HTTPException(status_code=404, detail="Batch API is disabled")
+    
+    try:
+        status, answers, failures = await rag_system.get_query_batch(batch_id)
+        return BatchStatusResponse(batch_id=batch_id, status=status, answers=answers, failures=failures)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/courses", response_model=CourseStats)
 async def get_course_stats():
     """Get course analytics and statistics"""
@@ -122,6 +181,12 @@ async def get_course_stats():
 @app.on_event("startup")
 async def startup_event():
     """Load initial documents on startup"""
+    # Propagate Ollama server tuning to any `ollama serve` launched from this process
+    os.environ.setdefault("OLLAMA_NUM_PARALLEL", str(config.OLLAMA_NUM_PARALLEL))
+    os.environ.setdefault("OLLAMA_MAX_LOADED_MODELS", str(config.OLLAMA_MAX_LOADED_MODELS))
+    os.environ.setdefault("OLLAMA_FLASH_ATTENTION", config.OLLAMA_FLASH_ATTENTION)
+    os.environ.setdefault("OLLAMA_KV_CACHE_TYPE", config.OLLAMA_KV_CACHE_TYPE)
+    
     docs_path = "../docs"
     if os.path.exists(docs_path):
         print("Loading initial documents...")
@@ -131,6 +196,12 @@ async def startup_event():
         except Exception as e:
             print(f"Error loading documents: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled LLM HTTP connections on shutdown"""
+    await rag_system.ai_generator.aclose()
+    await close_anthropic_clients()
+
 # Custom static file handler with no-cache headers for development
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
@@ -1,5 +1,6 @@
 import os
-import json
+import functools
+import orjson
 from dataclasses import dataclass
 from dotenv import load_dotenv
 from pathlib import Path
@@ -7,13 +8,14 @@ from pathlib import Path
 # Load environment variables from .env file
 load_dotenv()
 
-# Load model configuration
+MODEL_CONFIG_PATH = Path(__file__).parent / "model_config.json"
+
+# Load model configuration - read once per process
+@functools.lru_cache(maxsize=1)
 def load_model_config():
     """Load model configuration from JSON file"""
-    config_path = Path(__file__).parent / "model_config.json"
     try:
-        with open(config_path, 'r') as f:
-            return json.load(f)
+        return orjson.loads(MODEL_CONFIG_PATH.read_bytes())
     except FileNotFoundError:
         # Fallback configuration if file doesn't exist
         return {
@@ -25,8 +27,14 @@ def load_model_config():
 class Config:
     """Configuration settings for the RAG system"""
     def __post_init__(self):
-        """Load model configuration after initialization"""
+        """Load model configuration and resolve model names once after initialization"""
         self.model_config = load_model_config()
+        
+        # Environment overrides take precedence over the config file
+        self.ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL",
+                                         self.model_config.get('anthropic', {}).get('default_model', 'claude-sonnet-4-20250514'))
+        self.OLLAMA_MODEL = os.getenv("OLLAMA_MODEL",
+                                      self.model_config.get('ollama', {}).get('default_model', 'qwen2.5:7b'))
     
     # AI Provider settings - defaults to local Ollama
     AI_PROVIDER: str = os.getenv("AI_PROVIDER", "ollama")  # "anthropic" or "ollama"
@@ -37,17 +45,14 @@ class Config:
     # Ollama settings
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     
-    @property
-    def ANTHROPIC_MODEL(self) -> str:
-        """Get Anthropic model from config file"""
-        return os.getenv("ANTHROPIC_MODEL", 
-                        getattr(self, 'model_config', {}).get('anthropic', {}).get('default_model', 'claude-sonnet-4-20250514'))
+    # Ollama server tuning - read by `ollama serve`, so set these before starting the server
+    OLLAMA_NUM_PARALLEL: int = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))            # Concurrent requests per loaded model
+    OLLAMA_MAX_LOADED_MODELS: int = int(os.getenv("OLLAMA_MAX_LOADED_MODELS", "2"))  # Models kept in memory at once
+    OLLAMA_FLASH_ATTENTION: str = os.getenv("OLLAMA_FLASH_ATTENTION", "1")           # Required for a quantized KV cache
+    OLLAMA_KV_CACHE_TYPE: str = os.getenv("OLLAMA_KV_CACHE_TYPE", "q8_0")            # Quantized KV cache (ignored without flash attention)
     
-    @property 
-    def OLLAMA_MODEL(self) -> str:
-        """Get Ollama model from config file"""
-        return os.getenv("OLLAMA_MODEL",
-                        getattr(self, 'model_config', {}).get('ollama', {}).get('default_model', 'qwen2.5:7b'))
+    # Anthropic Message Batches API for non-interactive bulk queries
+    ENABLE_BATCH_API: bool = os.getenv("ENABLE_BATCH_API", "false").lower() == "true"
     
     # Embedding model settings
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
@@ -58,6 +63,10 @@ class Config:
     MAX_RESULTS: int = 5         # Maximum search results to return
     MAX_HISTORY: int = 2         # Number of conversation messages to remember
     
+    # Response cache settings
+    RESPONSE_CACHE_SIZE: int = 2048  # Maximum cached (query, history) answers
+    RESPONSE_CACHE_TTL: int = 600    # Seconds before a cached answer expires
+    
     # Database paths
     CHROMA_PATH: str = "./chroma_db"  # ChromaDB storage location
 
@@ -1,5 +1,7 @@
 from typing import List, Tuple, Optional, Dict
 import os
+import hashlib
+from cachetools import TTLCache
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
 from ai_generator import AIGenerator
@@ -41,6 +43,9 @@ class RAGSystem:
         self.outline_tool = CourseOutlineTool(self.vector_store)
         self.tool_manager.register_tool(self.search_tool)
         self.tool_manager.register_tool(self.outline_tool)
+        
+        # Cache of (response, sources) for repeated identical queries
+        self.response_cache = TTLCache(maxsize=config.RESPONSE_CACHE_SIZE, ttl=config.RESPONSE_CACHE_TTL)
     
     def add_course_document(self, file_path: str) -> Tuple[Course, int]:
         """
@@ -62,6 +67,9 @@ class RAGSystem:
             # Add course content chunks to vector store
             self.vector_store.add_course_content(course_chunks)
             
+            # Cached answers may be stale once the knowledge base changes
+            self.response_cache.clear()
+            
             return course, len(course_chunks)
         except Exception as e:
             print(f"Error processing course document {file_path}: {e}")
@@ -90,6 +98,9 @@ class RAGSystem:
             print(f"Folder {folder_path} does not exist")
             return 0, 0
         
+        # Cached answers may be stale once the knowledge base changes
+        self.response_cache.clear()
+        
         # Get existing course titles to avoid re-processing
         existing_course_titles = set(self.vector_store.get_existing_course_titles())
         
@@ -117,7 +128,12 @@ class RAGSystem:
         
         return total_courses, total_chunks
     
-    def query(self, query: str, session_id: Optional[str] = None) -> Tuple[str, List[str]]:
+    def _response_cache_key(self, prompt: str, history: Optional[List[Dict[str, str]]]) -> bytes:
+        """Hash provider, model, prompt and history into a compact response cache key"""
+        raw = f"{self.ai_generator.provider}|{self.ai_generator.model}|{prompt}|{history}"
+        return hashlib.blake2b(raw.encode(), digest_size=16).digest()
+    
+    async def query(self, query: str, session_id: Optional[str] = None) -> Tuple[str, List[str]]:
         """
         Process a user query using the RAG system with tool-based search.
         
@@ -134,21 +150,22 @@ class RAGSystem:
         # Get conversation history if session exists
         history = None
         if session_id:
-            history = self.session_manager.get_conversation_history(session_id)
+            history = self.session_manager.get_history_messages(session_id)
         
-        # Generate response using AI with tools
-        response = self.ai_generator.generate_response(
-            query=prompt,
-            conversation_history=history,
-            tools=self.tool_manager.get_tool_definitions(),
-            tool_manager=self.tool_manager
-        )
-        
-        # Get sources from the search tool
-        sources = self.tool_manager.get_last_sources()
-
-        # Reset sources after retrieving them
-        self.tool_manager.reset_sources()
+        cache_key = self._response_cache_key(prompt, history)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            response, sources = cached
+        else:
+            # Generate response using AI with tools - sources belong to this request only
+            response, sources = await self.ai_generator.generate_response(
+                query=prompt,
+                conversation_history=history,
+                tools=self.tool_manager.get_tool_definitions(),
+                tool_manager=self.tool_manager
+            )
+            
+            self.response_cache[cache_key] = (response, sources)
         
         # Update conversation history
         if session_id:
@@ -157,7 +174,7 @@ class RAGSystem:
         # Return response with sources from tool searches
         return response, sources
     
-    def query_stream(self, query: str, session_id: Optional[str] = None):
+    async def query_stream(self, query: str, session_id: Optional[str] = None):
         """
         Process a user query using the RAG system with streaming response.
         
@@ -174,14 +191,28 @@ class RAGSystem:
         # Get conversation history if session exists
         history = None
         if session_id:
-            history = self.session_manager.get_conversation_history(session_id)
+            history = self.session_manager.get_history_messages(session_id)
         
         # Start streaming response
         yield {"type": "session_id", "session_id": session_id}
         
+        # Replay a cached answer in one chunk when available
+        cache_key = self._response_cache_key(prompt, history)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            full_response, sources = cached
+            yield {"type": "content", "content": full_response}
+            if sources:
+                yield {"type": "sources", "sources": sources}
+            if session_id:
+                self.session_manager.add_exchange(session_id, query, full_response)
+            return
+        
         # Generate streaming response using AI with tools
         full_response = ""
-        for chunk in self.ai_generator.generate_response_stream(
+        sources = []
+        failed = False
+        async for chunk in self.ai_generator.generate_response_stream(
             query=prompt,
             conversation_history=history,
             tools=self.tool_manager.get_tool_definitions(),
@@ -189,13 +220,48 @@ class RAGSystem:
         ):
             if chunk.get("type") == "content":
                 full_response += chunk.get("content", "")
+                failed = failed or chunk.get("error", False)
+                yield chunk
+            elif chunk.get("type") == "discard":
+                # Pre-tool preamble - keep it out of session history and the response cache
+                full_response = ""
                 yield chunk
             elif chunk.get("type") == "sources":
+                sources = chunk.get("sources", [])
                 yield chunk
         
         # Update conversation history
         if session_id and full_response:
             self.session_manager.add_exchange(session_id, query, full_response)
+        
+        # Only cache answers from a generation that completed without error
+        if full_response and not failed:
+            self.response_cache[cache_key] = (full_response, sources)
+    
+    async def submit_query_batch(self, queries: List[str]) -> str:
+        """
+        Submit many independent queries to the AI provider's batch API.
+        
+        Args:
+            queries: User questions, answered without conversation history or tools
+            
+        Returns:
+            Batch id for use with get_query_batch
+        """
+        prompts = [f"""Answer this question about course materials: {query}""" for query in queries]
+        return await self.ai_generator.submit_batch(prompts)
+    
+    async def get_query_batch(self, batch_id: str) -> Tuple[str, Optional[List[Optional[str]]], Dict[int, str]]:
+        """
+        Get the status of a query batch and its answers once it has ended.
+        
+        Args:
+            batch_id: Id returned by submit_query_batch
+            
+        Returns:
+            Tuple of (processing status, answers in query order or None, failures by query index)
+        """
+        return await self.ai_generator.get_batch_results(batch_id)
     
     def get_course_analytics(self) -> Dict:
         """Get analytics about the course catalog"""
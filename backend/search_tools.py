@@ -1,7 +1,14 @@
-from typing import Dict, Any, Optional, Protocol
+from typing import Dict, Any, List, Optional, Protocol, Tuple
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import os
 from vector_store import VectorStore, SearchResults
 
+# Bounded pool for blocking tool calls (ChromaDB queries, embeddings) so they don't stall the event loop
+TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_POOL_SIZE", "16")), thread_name_prefix="tool")
+
 
 class Tool(ABC):
     """Abstract base class for all tools"""
@@ -15,6 +22,10 @@ class Tool(ABC):
     def execute(self, **kwargs) -> str:
         """Execute the tool with given parameters"""
         pass
+    
+    def execute_with_sources(self, **kwargs) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute the tool and return its output together with the sources it used"""
+        return self.execute(**kwargs), []
 
 
 class CourseSearchTool(Tool):
@@ -22,7 +33,6 @@ class CourseSearchTool(Tool):
     
     def __init__(self, vector_store: VectorStore):
         self.store = vector_store
-        self.last_sources = []  # Track sources from last search
     
     def get_tool_definition(self) -> Dict[str, Any]:
         """Return Anthropic tool definition for this tool"""
@@ -61,6 +71,24 @@ class CourseSearchTool(Tool):
         Returns:
             Formatted search results or error message
         """
+        return self.execute_with_sources(query, course_name, lesson_number)[0]
+    
+    def execute_with_sources(self, query: str, course_name: Optional[str] = None,
+                             lesson_number: Optional[int] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Execute the search tool and return the sources of this search.
+        
+        Sources are returned per call rather than stored on the tool, so concurrent
+        requests sharing this tool never see each other's sources.
+        
+        Args:
+            query: What to search for
+            course_name: Optional course filter
+            lesson_number: Optional lesson filter
+            
+        Returns:
+            Tuple of (formatted search results or error message, sources for the UI)
+        """
         
         # Use the vector store's unified search interface
         results = self.store.search(
@@ -71,7 +99,7 @@ class CourseSearchTool(Tool):
         
         # Handle errors
         if results.error:
-            return results.error
+            return results.error, []
         
         # Handle empty results
         if results.is_empty():
@@ -80,12 +108,12 @@ class CourseSearchTool(Tool):
                 filter_info += f" in course '{course_name}'"
             if lesson_number:
                 filter_info += f" in lesson {lesson_number}"
-            return f"No relevant content found{filter_info}."
+            return f"No relevant content found{filter_info}.", []
         
         # Format and return results
         return self._format_results(results)
     
-    def _format_results(self, results: SearchResults) -> str:
+    def _format_results(self, results: SearchResults) -> Tuple[str, List[Dict[str, Any]]]:
         """Format search results with course and lesson context"""
         formatted = []
         sources = []  # Track sources with links for the UI
@@ -117,10 +145,7 @@ class CourseSearchTool(Tool):
             
             formatted.append(f"{header}\n{doc}")
         
-        # Store sources for retrieval
-        self.last_sources = sources
-        
-        return "\n\n".join(formatted)
+        return "\n\n".join(formatted), sources
 
 class CourseOutlineTool(Tool):
     """Tool for retrieving course outline and structure information"""
@@ -217,23 +242,13 @@ class ToolManager:
         """Get all tool definitions for Anthropic tool calling"""
         return [tool.get_tool_definition() for tool in self.tools.values()]
     
-    def execute_tool(self, tool_name: str, **kwargs) -> str:
-        """Execute a tool by name with given parameters"""
+    async def execute_tool(self, tool_name: str, **kwargs) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute a tool by name on the tool thread pool, returning (output, sources)"""
         if tool_name not in self.tools:
-            return f"Tool '{tool_name}' not found"
+            return f"Tool '{tool_name}' not found", []
         
-        return self.tools[tool_name].execute(**kwargs)
-    
-    def get_last_sources(self) -> list:
-        """Get sources from the last search operation"""
-        # Check all tools for last_sources attribute
-        for tool in self.tools.values():
-            if hasattr(tool, 'last_sources') and tool.last_sources:
-                return tool.last_sources
-        return []
-
-    def reset_sources(self):
-        """Reset sources from all tools that track sources"""
-        for tool in self.tools.values():
-            if hasattr(tool, 'last_sources'):
-                tool.last_sources = []
\ No newline at end of file
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            TOOL_EXECUTOR,
+            functools.partial(self.tools[tool_name].execute_with_sources, **kwargs)
+        )
\ No newline at end of file
@@ -55,6 +55,17 @@ class SessionManager:
         
         return "\n".join(formatted_messages)
     
+    def get_history_messages(self, session_id: Optional[str]) -> Optional[List[Dict[str, str]]]:
+        """Get conversation history as role/content dicts for replay as chat turns"""
+        if not session_id or session_id not in self.sessions:
+            return None
+        
+        messages = self.sessions[session_id]
+        if not messages:
+            return None
+        
+        return [{"role": msg.role, "content": msg.content} for msg in messages]
+    
     def clear_session(self, session_id: str):
         """Clear all messages from a session"""
         if session_id in self.sessions:
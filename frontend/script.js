@@ -225,6 +225,10 @@ async function handleStreamingResponse(query, loadingMessage) {
                             // Convert markdown and update display
                             contentDiv.innerHTML = marked.parse(fullContent);
                             chatMessages.scrollTop = chatMessages.scrollHeight;
+                        } else if (chunk.type === 'discard') {
+                            // Drop preamble streamed before a tool call
+                            fullContent = '';
+                            contentDiv.innerHTML = '';
                         } else if (chunk.type === 'sources') {
                             sources = chunk.sources;
                         } else if (chunk.error) {